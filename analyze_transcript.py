@@ -4,18 +4,52 @@ Analyze Claude Code transcript files for token usage patterns.
 Used for debugging cache invalidation detection and analyzing token usage per message.
 """
 
+from __future__ import annotations
+
+import argparse
 import json
+import mmap
+import multiprocessing
+import os
 import sys
 import re
+from array import array
+from collections import deque
+from functools import lru_cache
 from pathlib import Path
-from datetime import datetime
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Optional, Sequence, Tuple, Union
 try:
-    from urllib.request import urlopen
-    from urllib.error import URLError
+    import orjson
+    _json_loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
 except ImportError:
-    urlopen = None
-
-def format_number(n):
+    # stdlib json accepts bytes too, just slower (invalid UTF-8 raises
+    # UnicodeDecodeError, so catch the common ValueError base)
+    _json_loads = json.loads  # type: ignore[assignment]
+    _JSONDecodeError = ValueError  # type: ignore[assignment,misc]
+try:
+    import numpy as np
+except ImportError:
+    np = None  # type: ignore[assignment]
+# Importing numba and loading its cached scan costs more than the scan
+# itself on any realistic transcript, so the JIT is opt-in
+if os.environ.get('ANALYZE_TRANSCRIPT_JIT') == '1':
+    try:
+        import numba
+    except ImportError:
+        numba = None  # type: ignore[assignment]
+else:
+    # Without numba the scan runs as plain Python over array('q') columns
+    numba = None  # type: ignore[assignment]
+
+def _jit(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Compile func with numba.njit(cache=True) when numba is available"""
+    if numba is None:
+        return func
+    return numba.njit(cache=True)(func)
+
+@lru_cache(maxsize=4096)
+def format_number(n: int) -> str:
     """Format large numbers with k/m suffix"""
     if n >= 1_000_000:
         return f"{n/1_000_000:.1f}m"
@@ -71,120 +105,633 @@ PRICING = {
     },
 }
 
-def analyze_transcript(transcript_path):
-    """Analyze transcript file and show token usage per message"""
-
-    if not Path(transcript_path).exists():
-        print(f"Error: File not found: {transcript_path}")
-        return
-
-    print(f"Analyzing: {transcript_path}\n")
-
-    # Print table header
-    header = f"{'Msg#':>5} {'Input':>8} {'Output':>8} {'CacheR':>8} {'CacheC':>8} {'Ctx':>8} {'Eff%':>7} {'Event'}"
-    print(header)
-    print("=" * 130)
+# Key every line with usage carries, checked before parsing
+_USAGE_KEY = re.compile(rb'"usage"\s*:\s*\{')
+
+def _extract_usage(line: bytes) -> Optional[tuple[dict[str, Any], str]]:
+    """Return (usage, model_name) for a transcript line, or None if it has no usage.
+
+    Lines without a usage object key are rejected before any JSON parsing.
+    """
+    # Most records (tool results, system events) have no usage at all
+    if _USAGE_KEY.search(line) is None:
+        return None
+
+    try:
+        data = _json_loads(line)
+    except _JSONDecodeError:
+        return None
+
+    if not isinstance(data, dict):
+        return None
+
+    # Extract usage data (message.usage, or top-level usage for older records)
+    message = data.get('message')
+    usage = message.get('usage') if message and 'usage' in message else data.get('usage')
+    if not usage:
+        return None
+
+    model_name = message.get('model', 'unknown') if message else 'unknown'
+    return usage, model_name
+
+# (inp, out, cr, cc, model_ids, model_names) as returned by _parse_lines
+_Columns = Tuple[array, array, array, array, array, List[str]]
+
+# Anything _read_lines can read from: an open file or a memory map
+_Source = Union[BinaryIO, mmap.mmap]
+
+def _parse_lines(lines: Iterable[bytes]) -> _Columns:
+    """Parse transcript lines into token columns.
+
+    Returns (inp, out, cr, cc, model_ids, model_names) where the first five are
+    array('q') columns with one row per message and model_ids index model_names.
+    """
+    inp, out, cr, cc, model_ids = (array('q') for _ in range(5))
+    model_names: list[str] = []
+    model_index: dict[str, int] = {}
+
+    for line in lines:
+        if len(line) <= 1:
+            continue
+
+        record = _extract_usage(line)
+        if record is None:
+            continue
+        usage, model_name = record
+
+        # Extract token counts; int() takes counts written as floats (1.0),
+        # and counts that are not numbers or do not fit int64 skip the message
+        try:
+            inp.append(int(usage.get('input_tokens', 0)))
+            out.append(int(usage.get('output_tokens', 0)))
+            cr.append(int(usage.get('cache_read_input_tokens', 0)))
+            cc.append(int(usage.get('cache_creation_input_tokens', 0)))
+        except (TypeError, ValueError, OverflowError):
+            for column in (inp, out, cr, cc):
+                del column[len(model_ids):]
+            print(f"Warning: skipping message with unusable token counts: {usage}", file=sys.stderr)
+            continue
+
+        model_id = model_index.get(model_name)
+        if model_id is None:
+            model_id = model_index[model_name] = len(model_names)
+            model_names.append(model_name)
+        model_ids.append(model_id)
+
+    return inp, out, cr, cc, model_ids, model_names
+
+def _shard_bounds(mm: mmap.mmap, shards: int) -> list[tuple[int, int]]:
+    """Split a mapped transcript into about equal (start, end) byte ranges on line boundaries"""
+    size = len(mm)
+    bounds = [0]
+    for k in range(1, shards):
+        # Cut after the last newline before the target so no line is split
+        cut = mm.rfind(b'\n', bounds[-1], size * k // shards) + 1
+        if cut > bounds[-1]:
+            bounds.append(cut)
+    bounds.append(size)
+    return list(zip(bounds, bounds[1:]))
+
+def _advise_sequential(f: BinaryIO) -> None:
+    """Tell the kernel f is read front to back so it reads ahead more aggressively"""
+    if hasattr(os, 'posix_fadvise'):
+        try:
+            os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_SEQUENTIAL)
+        except OSError:
+            # Pipes and some filesystems do not take advice; it is only a hint
+            pass
+
+# Lines up to about this size are handed out whole; longer ones are scanned
+# chunk by chunk for their usage and model instead of being buffered
+_CHUNK_BYTES = 256 * 1024
+# Largest usage object the long-line scanner will buffer
+_MAX_USAGE_BYTES = 64 * 1024
+# Longest key or model name the long-line scanner will buffer
+_MAX_TOKEN_BYTES = 256
+
+# Outside strings only these bytes matter to _UsageScanner; inside a string
+# it looks for the closing quote, stepping over escapes with the regex
+_STRUCTURAL = re.compile(rb'[{}\[\]":]')
+_STRING_BODY = re.compile(rb'(?:[^"\\]+|\\.)*')
+_WHITESPACE = re.compile(rb'[ \t\r\n]*')
+
+def _match_end(pattern: re.Pattern[bytes], data: bytes, pos: int) -> int:
+    """Return where pattern, which may match nothing, stops matching at data[pos]"""
+    match = pattern.match(data, pos)
+    return pos if match is None else match.end()
+
+# Fields _UsageScanner keeps, by key: at the top level and inside "message"
+_ROOT_FIELDS = {b'"message"': 'message', b'"usage"': 'top_usage'}
+_MESSAGE_FIELDS = {b'"model"': 'model', b'"usage"': 'usage'}
+
+class _UsageScanner:
+    """Pick message.model, message.usage and the top-level usage out of one
+    JSON line fed in pieces of any size.
+
+    Strings and nesting are tracked across pieces, so keys only count where
+    a full parse would see them (not in nested records or string contents),
+    and only the wanted values are buffered.
+    """
+
+    def __init__(self) -> None:
+        self.size = 0                    # bytes fed so far
+        self.stack = bytearray()         # open containers, b'{' or b'['
+        self.keys: list[Optional[bytes]] = []  # latest key in each open container
+        self.in_string = False
+        self.escape = False              # a piece ended on a backslash in a string
+        self.token: Optional[bytearray] = None  # current string, while short
+        self.last_string: Optional[bytes] = None
+        self.after_string = False        # a following ':' makes last_string a key
+        self.expect: Optional[str] = None  # field whose value comes next
+        self.fields: dict[str, bytes] = {}  # raw values; 'message' only marks the object
+        self.capture: Optional[bytearray] = None  # usage object being copied
+        self.capture_field = ''
+        self.capture_depth = 0
+        self.done = False                # the top-level object is closed
+        self.invalid = False             # not a JSON object: no usage
+        self.odd = False                 # valid maybe, but record() cannot stand in
+
+    def feed(self, data: bytes) -> None:
+        """Scan the next piece of the line"""
+        self.size += len(data)
+        if self.invalid or self.odd:
+            return
+        pos = 0
+        size = len(data)
+        capture_from = 0
+        while pos < size:
+            if self.done:
+                # Only whitespace may follow the top-level object
+                if _match_end(_WHITESPACE, data, pos) < size:
+                    self.invalid = True
+                return
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                    self._collect(data, pos, pos + 1)
+                    pos += 1
+                    continue
+                quote = data.find(b'"', pos)
+                end = size if quote == -1 else quote
+                if data.find(b'\\', pos, end) != -1:
+                    # Escapes: let the regex step over escaped quotes
+                    end = _match_end(_STRING_BODY, data, pos)
+                if end == size or data[end] == 0x5c:  # piece ends in the string
+                    self.escape = end < size
+                    self._collect(data, pos, size)
+                    break
+                self._collect(data, pos, end + 1)
+                pos = end + 1
+                self.in_string = False
+                self.after_string = True
+                self.last_string = bytes(self.token) if self.token is not None else None
+                if self.expect == 'model':
+                    self.expect = None
+                    if self.last_string is None:
+                        self.odd = True
+                        return
+                    self.fields['model'] = self.last_string
+                continue
 
-    message_num = 0
-    prev_cache_read = 0
-    prev_cache_create = 0
+            if self.expect is not None:
+                # The wanted value must be an object (or a string for the
+                # model); anything else is left to the full parse
+                pos = _match_end(_WHITESPACE, data, pos)
+                if pos == size:
+                    break
+                if data[pos] != (0x22 if self.expect == 'model' else 0x7b):
+                    self.odd = True
+                    return
+
+            match = _STRUCTURAL.search(data, pos)
+            if match is None:
+                break
+            pos = match.end()
+            char = data[pos - 1]
+            after_string = self.after_string
+            self.after_string = False
+
+            if char == 0x22:  # "
+                self.in_string = True
+                self.token = bytearray(b'"')
+            elif char == 0x3a:  # :
+                if not after_string or not self.stack or self.stack[-1] != 0x7b:
+                    self.invalid = True
+                    return
+                key = self.last_string
+                self.keys[-1] = key
+                depth = len(self.stack)
+                if depth > 2 or key is None:
+                    continue
+                if b'\\' in key:
+                    # An escaped key could still spell one of ours
+                    self.odd = True
+                    return
+                if depth == 1:
+                    field = _ROOT_FIELDS.get(key)
+                elif self.keys[0] == b'"message"' and self.stack[1] == 0x7b:
+                    field = _MESSAGE_FIELDS.get(key)
+                else:
+                    field = None
+                if field is not None:
+                    if field in self.fields:
+                        # Duplicate key: which one wins is up to the parser
+                        self.odd = True
+                        return
+                    self.expect = field
+            elif char == 0x7b or char == 0x5b:  # { [
+                if not self.stack and char != 0x7b:
+                    self.invalid = True
+                    return
+                if self.expect == 'message':
+                    self.fields['message'] = b''
+                elif self.expect is not None:
+                    self.capture = bytearray()
+                    self.capture_field = self.expect
+                    self.capture_depth = len(self.stack)
+                    capture_from = pos - 1
+                self.expect = None
+                self.stack.append(char)
+                self.keys.append(None)
+            else:  # } ]
+                if not self.stack or char - self.stack[-1] != 2:
+                    self.invalid = True
+                    return
+                self.stack.pop()
+                self.keys.pop()
+                if self.capture is not None and len(self.stack) == self.capture_depth:
+                    self.capture += data[capture_from:pos]
+                    self.fields[self.capture_field] = bytes(self.capture)
+                    self.capture = None
+                self.done = not self.stack
+
+        if self.capture is not None:
+            self.capture += data[capture_from:]
+            if len(self.capture) > _MAX_USAGE_BYTES:
+                self.odd = True
+
+    def _collect(self, data: bytes, start: int, end: int) -> None:
+        """Add data[start:end] to the current string unless it grew too long"""
+        if self.token is not None:
+            if len(self.token) + end - start > _MAX_TOKEN_BYTES:
+                self.token = None
+            else:
+                self.token += data[start:end]
+
+    def record(self) -> Optional[bytes]:
+        """Return a minimal line that _extract_usage reads like the scanned one.
+
+        That is b'' when the line has no usage (or is not a JSON object), and
+        None when the line has a shape the stand-in cannot reproduce and has
+        to be parsed whole.
+        """
+        if self.odd:
+            return None
+        fields = self.fields
+        if self.invalid or not self.done or ('usage' not in fields and 'top_usage' not in fields):
+            return b''
+        parts = []
+        if 'message' in fields:
+            members = [b'"' + name.encode() + b'":' + fields[name]
+                       for name in ('model', 'usage') if name in fields]
+            parts.append(b'"message":{' + b','.join(members) + b'}')
+        if 'top_usage' in fields:
+            parts.append(b'"usage":' + fields['top_usage'])
+        return b'{' + b','.join(parts) + b'}'
+
+def _read_lines(f: _Source, end: Optional[int] = None) -> Iterator[bytes]:
+    """Yield every line from f's position up to end (or EOF), without the newline.
+
+    Lines longer than _CHUNK_BYTES go through _scan_long_line, which keeps
+    memory bounded by yielding a compact stand-in record instead of the line.
+    """
+    pending = b''
+    while True:
+        size = _CHUNK_BYTES if end is None else min(_CHUNK_BYTES, end - f.tell())
+        chunk = f.read(size) if size > 0 else b''
+        if not chunk:
+            break
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        yield from lines
+        if len(pending) > _CHUNK_BYTES:
+            line, pending = _scan_long_line(f, pending, end)
+            yield line
+    if pending:
+        # What followed a long line can still hold several lines
+        yield from pending.split(b'\n')
+
+def _scan_long_line(f: _Source, head: bytes, end: Optional[int]) -> tuple[bytes, bytes]:
+    """Reduce an over-long line to what _extract_usage needs from it.
+
+    head is the part of the line already read from f; the rest is read in
+    _CHUNK_BYTES pieces up to the newline and fed to a _UsageScanner.
+    Returns (record, rest), where rest is whatever followed the newline in
+    the last chunk and record is the scanner's stand-in line, or the
+    original line read back whole when the scanner cannot stand in for it.
+    """
+    line_start = f.tell() - len(head)
+    scanner = _UsageScanner()
+    scanner.feed(head)
+    rest = b''
+    while True:
+        size = _CHUNK_BYTES if end is None else min(_CHUNK_BYTES, end - f.tell())
+        data = f.read(size) if size > 0 else b''
+        if not data:
+            break
+        newline = data.find(b'\n')
+        if newline != -1:
+            scanner.feed(data[:newline])
+            rest = data[newline + 1:]
+            break
+        scanner.feed(data)
+
+    record = scanner.record()
+    if record is not None:
+        return record, rest
+
+    # Unusual shape: read the line back whole and let _extract_usage decide
+    resume = f.tell()
+    f.seek(line_start)
+    line = f.read(scanner.size)
+    f.seek(resume)
+    return line, rest
+
+def _parse_shard(shard: tuple[str, int, int]) -> _Columns:
+    """Pool worker: parse one (path, start, end) byte range of a transcript"""
+    path, start, end = shard
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if hasattr(mmap, 'MADV_SEQUENTIAL'):
+            page_start = start - start % mmap.PAGESIZE
+            mm.madvise(mmap.MADV_SEQUENTIAL, page_start, end - page_start)
+        mm.seek(start)
+        return _parse_lines(_read_lines(mm, end))
+
+# Bytes read from the end of the file for --tail before falling back to a full scan
+_TAIL_WINDOW_BYTES = 2 * 1024 * 1024
+
+def _last_usage_lines(lines: Iterable[bytes], count: int) -> deque[bytes]:
+    """Keep the last count lines that carry usage, in file order"""
+    return deque((line for line in lines if len(line) > 1 and _extract_usage(line) is not None),
+                 maxlen=count)
+
+def _parse_tail(transcript_path: str, count: int) -> _Columns:
+    """Parse only the last count messages of a transcript (see _parse_lines).
+
+    Reads the trailing _TAIL_WINDOW_BYTES of the file and only rescans from
+    the start when that window holds fewer than count messages.
+    """
+    start = max(0, os.path.getsize(transcript_path) - _TAIL_WINDOW_BYTES)
+    with open(transcript_path, 'rb') as f:
+        # Step back one byte so the first line read is just the partial one
+        f.seek(max(0, start - 1))
+        window = _read_lines(f)
+        if start > 0:
+            next(window, None)
+        lines = _last_usage_lines(window, count)
+        if len(lines) < count and start > 0:
+            f.seek(0)
+            _advise_sequential(f)
+            lines = _last_usage_lines(_read_lines(f), count)
+    return _parse_lines(lines)
+
+def _parse_transcript(transcript_path: str, jobs: int = 1) -> _Columns:
+    """Parse a transcript file into token columns (see _parse_lines).
+
+    With jobs > 1 the file is memory-mapped, split on line boundaries and
+    parsed by a pool of that many processes; shard results are merged in
+    file order with their local model ids remapped onto one shared model list.
+    An empty file is parsed sequentially, as it cannot be memory-mapped.
+    """
+    if jobs < 2 or os.path.getsize(transcript_path) == 0:
+        with open(transcript_path, 'rb') as f:
+            _advise_sequential(f)
+            return _parse_lines(_read_lines(f))
+
+    with open(transcript_path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        bounds = _shard_bounds(mm, jobs)
+    with multiprocessing.Pool(len(bounds)) as pool:
+        shards = pool.map(_parse_shard, [(transcript_path, start, end) for start, end in bounds])
+
+    inp, out, cr, cc, model_ids = (array('q') for _ in range(5))
+    model_names: list[str] = []
+    model_index: dict[str, int] = {}
+    for shard_inp, shard_out, shard_cr, shard_cc, shard_ids, shard_names in shards:
+        remap = []
+        for model_name in shard_names:
+            if model_name not in model_index:
+                model_index[model_name] = len(model_names)
+                model_names.append(model_name)
+            remap.append(model_index[model_name])
+        inp.extend(shard_inp)
+        out.extend(shard_out)
+        cr.extend(shard_cr)
+        cc.extend(shard_cc)
+        model_ids.extend(remap[model_id] for model_id in shard_ids)
+
+    return inp, out, cr, cc, model_ids, model_names
+
+# Cache event codes written by _scan
+EVENT_NONE = 0
+EVENT_CACHE_START = 1
+EVENT_CACHE_READ = 2
+EVENT_INVALIDATION = 3
+EVENT_GREW = 4
+
+# Row labels indexed by event code; the last two take the drop/growth size
+EVENT_LABELS = (
+    "",
+    "🆕 CACHE START",
+    "⚡ CACHE READ",
+    "🔄 INVALIDATION (↓{})",
+    "📈 GREW (+{})",
+)
+
+def _zeros(n: int, typecode: str = 'q') -> Any:
+    """Allocate a zeroed int64 ('q') or float64 ('d') column"""
+    if _SCAN_JITTED:
+        return np.zeros(n, dtype=np.int64 if typecode == 'q' else np.float64)
+    return array(typecode, bytes(8 * n))
+
+def _column(values: array) -> Any:
+    """View an array('q') column as a NumPy array when the scan is jitted"""
+    if _SCAN_JITTED:
+        return np.frombuffer(values, dtype=np.int64)
+    return values
+
+def _per_model_sums(model_ids: array, columns: Sequence[array], n_models: int) -> list[list[int]]:
+    """Reduce token columns per model id.
+
+    Returns [messages, *column_sums], each a list of n_models ints indexed by
+    model id.
+    """
+    if np is not None:
+        ids = np.frombuffer(model_ids, dtype=np.int64)
+        sums = [np.bincount(ids, minlength=n_models).tolist()]
+        for column in columns:
+            weights = np.frombuffer(column, dtype=np.int64)
+            sums.append(np.bincount(ids, weights=weights, minlength=n_models).astype(np.int64).tolist())
+        return sums
+
+    sums = [[0] * n_models for _ in range(len(columns) + 1)]
+    for i, model_id in enumerate(model_ids):
+        sums[0][model_id] += 1
+        for column, column_sums in zip(columns, sums[1:]):
+            column_sums[model_id] += column[i]
+    return sums
+
+# Token columns priced by _costs, in PRICING field names
+_PRICE_FIELDS = ('input', 'output', 'cache_read', 'cache_write')
+
+# PRICING flattened once at import: one rate row per model, looked up by _PRICE_INDEX
+_PRICE_INDEX = {model_name: i for i, model_name in enumerate(PRICING)}
+_PRICE_ROWS = [[pricing[field] for field in _PRICE_FIELDS] for pricing in PRICING.values()]
+_PRICE_MATRIX = np.array(_PRICE_ROWS) if np is not None else None
+
+def _costs(token_rows: list[list[int]], price_ids: list[int]) -> Sequence[float]:
+    """Dollar cost per model from [input, output, cache_read, cache_write] rows.
+
+    price_ids gives each row's _PRICE_INDEX entry (rates per million tokens).
+    """
+    if _PRICE_MATRIX is not None and token_rows:
+        terms = np.array(token_rows, dtype=np.float64) / 1_000_000 * _PRICE_MATRIX[price_ids]
+        # Add the terms left to right like the scalar branch; .sum(axis=1)
+        # may associate them differently and change the last digit
+        costs = terms[:, 0]
+        for column in range(1, terms.shape[1]):
+            costs = costs + terms[:, column]
+        return costs
+    return [sum(count / 1_000_000 * rate for count, rate in zip(tokens, _PRICE_ROWS[price_id]))
+            for tokens, price_id in zip(token_rows, price_ids)]
+
+@_jit
+def _scan(inp: Any, out: Any, cr: Any, cc: Any, events: Any, magnitudes: Any,
+          efficiency: Any, cumulative: Any) -> tuple[int, int, int, int, int, int]:
+    """Classify cache events and accumulate totals over the token columns.
+
+    Fills the per-message output columns in place and returns
+    (total_input, total_output, total_cache_read, total_cache_create,
+    invalidation_count, total_tokens_invalidated).
+    """
     total_input = 0
     total_output = 0
     total_cache_read = 0
     total_cache_create = 0
-
-    # Invalidation tracking
     invalidation_count = 0
     total_tokens_invalidated = 0
+    prev_cache_read = 0
+    prev_cache_create = 0
 
-    # Track usage per model
-    model_stats = {}
-
-    with open(transcript_path, 'r') as f:
-        for line_num, line in enumerate(f, 1):
-            if not line.strip():
-                continue
+    for i in range(len(inp)):
+        input_tokens = inp[i]
+        cache_read = cr[i]
+        cache_create = cc[i]
+
+        total_input += input_tokens
+        total_output += out[i]
+        total_cache_read += cache_read
+        total_cache_create += cache_create
+        # Cumulative fresh input tokens (overview of session growth)
+        cumulative[i] = total_input
+
+        if cache_read > 0:
+            efficiency[i] = ((cache_read - cache_create) / (input_tokens + cache_read)) * 100
+
+        # Detect cache events
+        if cache_create > 0 and prev_cache_create == 0:
+            events[i] = EVENT_CACHE_START
+        elif cache_read > 0 and prev_cache_read == 0:
+            events[i] = EVENT_CACHE_READ
+        elif prev_cache_read > 0 and cache_read < prev_cache_read:
+            drop = prev_cache_read - cache_read
+            if drop >= 10000:  # Significant drop
+                events[i] = EVENT_INVALIDATION
+                magnitudes[i] = drop
+                invalidation_count += 1
+                total_tokens_invalidated += drop
+        elif cache_read > prev_cache_read and prev_cache_read > 0:
+            increase = cache_read - prev_cache_read
+            if increase >= 1000:  # Only show significant growth
+                events[i] = EVENT_GREW
+                magnitudes[i] = increase
+
+        prev_cache_read = cache_read
+        prev_cache_create = cache_create
+
+    return (total_input, total_output, total_cache_read, total_cache_create,
+            invalidation_count, total_tokens_invalidated)
+
+# numba needs NumPy columns; the plain Python scan takes array('q')
+_SCAN_JITTED = hasattr(_scan, 'py_func')
+
+def analyze_transcript(transcript_path: str, tail: Optional[int] = None, jobs: int = 1) -> None:
+    """Analyze transcript file and show token usage per message.
+
+    With tail set only the last tail messages are read; totals, cache events
+    and costs then describe that window rather than the whole session.
+    jobs > 1 parses the whole file in that many processes.
+    """
 
-            try:
-                data = json.loads(line)
-            except json.JSONDecodeError:
-                continue
+    if not Path(transcript_path).exists():
+        print(f"Error: File not found: {transcript_path}")
+        return
 
-            # Extract usage data
-            usage = None
-            if 'message' in data and 'usage' in data['message']:
-                usage = data['message']['usage']
-            elif 'usage' in data:
-                usage = data['usage']
+    if tail is None:
+        print(f"Analyzing: {transcript_path}\n")
+    else:
+        print(f"Analyzing: {transcript_path} (last {tail} messages only, summary covers this window)\n")
 
-            if not usage:
-                continue
+    # Print table header
+    header = f"{'Msg#':>5} {'Input':>8} {'Output':>8} {'CacheR':>8} {'CacheC':>8} {'Ctx':>8} {'Eff%':>7} {'Event'}"
+    print(header)
+    print("=" * 130)
 
-            message_num += 1
-
-            # Extract model
-            model_name = data.get('message', {}).get('model', 'unknown')
-
-            # Extract token counts
-            input_tokens = usage.get('input_tokens', 0)
-            output_tokens = usage.get('output_tokens', 0)
-            cache_read = usage.get('cache_read_input_tokens', 0)
-            cache_create = usage.get('cache_creation_input_tokens', 0)
-
-            # Update totals
-            total_input += input_tokens
-            total_output += output_tokens
-            total_cache_read += cache_read
-            total_cache_create += cache_create
-
-            # Track cumulative fresh input tokens (overview of session growth)
-            cumulative_input = total_input
-
-            # Track per-model stats
-            if model_name not in model_stats:
-                model_stats[model_name] = {
-                    'messages': 0,
-                    'input': 0,
-                    'output': 0,
-                    'cache_read': 0,
-                    'cache_create': 0
-                }
-            model_stats[model_name]['messages'] += 1
-            model_stats[model_name]['input'] += input_tokens
-            model_stats[model_name]['output'] += output_tokens
-            model_stats[model_name]['cache_read'] += cache_read
-            model_stats[model_name]['cache_create'] += cache_create
-
-            # Calculate net efficiency (accounts for cache write overhead)
-            eff_str = "-"
-            if cache_read > 0:
-                net_eff = ((cache_read - cache_create) / (input_tokens + cache_read)) * 100
-                eff_str = f"{net_eff:.1f}"
-
-            # Detect cache events
-            cache_event = ""
-            if cache_create > 0 and prev_cache_create == 0:
-                cache_event = "🆕 CACHE START"
-            elif cache_read > 0 and prev_cache_read == 0:
-                cache_event = "⚡ CACHE READ"
-            elif prev_cache_read > 0 and cache_read < prev_cache_read:
-                drop = prev_cache_read - cache_read
-                if drop >= 10000:  # Significant drop
-                    cache_event = f"🔄 INVALIDATION (↓{format_number(drop)})"
-                    invalidation_count += 1
-                    total_tokens_invalidated += drop
-            elif cache_read > prev_cache_read and prev_cache_read > 0:
-                increase = cache_read - prev_cache_read
-                if increase >= 1000:  # Only show significant growth
-                    cache_event = f"📈 GREW (+{format_number(increase)})"
-
-            # Format single-line output
-            print(f"{message_num:>5} {format_number(input_tokens):>8} {format_number(output_tokens):>8} "
-                  f"{format_number(cache_read):>8} {format_number(cache_create):>8} "
-                  f"{format_number(cumulative_input):>8} {eff_str:>7} {cache_event}")
-
-            prev_cache_read = cache_read
-            prev_cache_create = cache_create
+    # Parse pass: token counts go into int64 columns, one row per message
+    if tail is None:
+        inp, out, cr, cc, model_ids, model_names = _parse_transcript(transcript_path, jobs)
+    else:
+        inp, out, cr, cc, model_ids, model_names = _parse_tail(transcript_path, tail)
+
+    # Scan pass: totals, efficiency and cache events
+    message_num = len(inp)
+    events = _zeros(message_num)
+    magnitudes = _zeros(message_num)
+    efficiency = _zeros(message_num, 'd')
+    cumulative = _zeros(message_num)
+    (total_input, total_output, total_cache_read, total_cache_create,
+     invalidation_count, total_tokens_invalidated) = _scan(
+        _column(inp), _column(out), _column(cr), _column(cc),
+        events, magnitudes, efficiency, cumulative)
+
+    # Plain lists index faster than arrays in the row loop below
+    events = events.tolist()
+    magnitudes = magnitudes.tolist()
+    efficiency = efficiency.tolist()
+    cumulative = cumulative.tolist()
+
+    rows = []
+    for i in range(message_num):
+        # Net efficiency accounts for cache write overhead
+        eff_str = f"{efficiency[i]:.1f}" if cr[i] > 0 else "-"
+
+        cache_event = EVENT_LABELS[events[i]]
+        if magnitudes[i]:
+            cache_event = cache_event.format(format_number(magnitudes[i]))
+
+        # Format single-line output
+        rows.append(f"{i + 1:>5} {format_number(inp[i]):>8} {format_number(out[i]):>8} "
+                    f"{format_number(cr[i]):>8} {format_number(cc[i]):>8} "
+                    f"{format_number(cumulative[i]):>8} {eff_str:>7} {cache_event}")
+
+    # One write for the whole table instead of a print() per row
+    if rows:
+        rows.append("")
+        sys.stdout.write("\n".join(rows))
+
+    # Track usage per model: parallel lists indexed by model id
+    (model_messages, model_input, model_output, model_cache_read,
+     model_cache_create) = _per_model_sums(model_ids, (inp, out, cr, cc), len(model_names))
 
     # Summary
     print("=" * 130)
@@ -222,23 +769,34 @@ def analyze_transcript(transcript_path):
     print("\nPER-MODEL BREAKDOWN & COSTS:")
     total_cost = 0.0
 
-    for model_name, stats in sorted(model_stats.items()):
-        print(f"\n{model_name}:")
-        print(f"  Messages: {stats['messages']}")
-        print(f"  Input:    {format_number(stats['input'])}")
-        print(f"  Output:   {format_number(stats['output'])}")
-        print(f"  Cache R:  {format_number(stats['cache_read'])}")
-        print(f"  Cache W:  {format_number(stats['cache_create'])}")
-
-        # Calculate cost if pricing is known
-        if model_name in PRICING:
-            pricing = PRICING[model_name]
-            cost = (
-                (stats['input'] / 1_000_000) * pricing['input'] +
-                (stats['output'] / 1_000_000) * pricing['output'] +
-                (stats['cache_read'] / 1_000_000) * pricing['cache_read'] +
-                (stats['cache_create'] / 1_000_000) * pricing['cache_write']
-            )
+    # Price actual usage and the no-cache equivalent (all input as fresh)
+    # for every model with known pricing in a single vector op
+    model_order = sorted(range(len(model_names)), key=model_names.__getitem__)
+    priced = [model_id for model_id in model_order if model_names[model_id] in _PRICE_INDEX]
+    price_ids = [_PRICE_INDEX[model_names[model_id]] for model_id in priced]
+    token_rows = []
+    uncached_rows = []
+    for model_id in priced:
+        token_rows.append([model_input[model_id], model_output[model_id],
+                           model_cache_read[model_id], model_cache_create[model_id]])
+        uncached_rows.append([model_input[model_id] + model_cache_read[model_id],
+                              model_output[model_id], 0, 0])
+    costs = [float(cost) for cost in _costs(token_rows + uncached_rows, price_ids + price_ids)]
+    model_costs = dict(zip(priced, zip(costs[:len(priced)], costs[len(priced):])))
+
+    # Add up the no-cache costs in first-seen order, as model ids are assigned
+    cost_without_cache = sum((model_costs[model_id][1] for model_id in sorted(model_costs)), 0.0)
+
+    for model_id in model_order:
+        print(f"\n{model_names[model_id]}:")
+        print(f"  Messages: {model_messages[model_id]}")
+        print(f"  Input:    {format_number(model_input[model_id])}")
+        print(f"  Output:   {format_number(model_output[model_id])}")
+        print(f"  Cache R:  {format_number(model_cache_read[model_id])}")
+        print(f"  Cache W:  {format_number(model_cache_create[model_id])}")
+
+        if model_id in model_costs:
+            cost = model_costs[model_id][0]
             total_cost += cost
             print(f"  Cost:     ${cost:.4f}")
         else:
@@ -249,18 +807,6 @@ def analyze_transcript(transcript_path):
 
     # Show cost comparison without cache
     if total_cache_read > 0:
-        # Calculate what it would cost without cache (all input as fresh)
-        cost_without_cache = 0.0
-        for model_name, stats in model_stats.items():
-            if model_name in PRICING:
-                pricing = PRICING[model_name]
-                total_input_for_model = stats['input'] + stats['cache_read']
-                cost = (
-                    (total_input_for_model / 1_000_000) * pricing['input'] +
-                    (stats['output'] / 1_000_000) * pricing['output']
-                )
-                cost_without_cache += cost
-
         savings = cost_without_cache - total_cost
         print(f"\nCost without cache:  ${cost_without_cache:.2f}")
         if cost_without_cache > 0:
@@ -268,9 +814,21 @@ def analyze_transcript(transcript_path):
         else:
             print(f"Savings from cache:  ${savings:.2f}")
 
-if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        print("Usage: python analyze_transcript.py <transcript.jsonl>")
-        sys.exit(1)
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description="Analyze Claude Code transcript files for token usage patterns.")
+    parser.add_argument('transcript', help="transcript .jsonl file")
+    parser.add_argument('--tail', type=int, metavar='N',
+                        help="only analyze the last N messages (reads just the end of the file)")
+    parser.add_argument('--jobs', type=int, default=1, metavar='N',
+                        help="parse the transcript in N processes (default 1; ignored with --tail)")
+    args = parser.parse_args()
+    if args.tail is not None and args.tail < 1:
+        parser.error("--tail must be at least 1")
+    if args.jobs < 1:
+        parser.error("--jobs must be at least 1")
+
+    analyze_transcript(args.transcript, args.tail, args.jobs)
 
-    analyze_transcript(sys.argv[1])
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Tests for the transcript parsing in analyze_transcript.py.
+Run with: python3 -m unittest test_analyze_transcript
+"""
+
+import contextlib
+import io
+import json
+import mmap
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+import analyze_transcript as at
+
+MODEL = 'claude-opus-4-6'
+USAGE = {'input_tokens': 12, 'output_tokens': 34,
+         'cache_read_input_tokens': 5600, 'cache_creation_input_tokens': 78}
+
+def encode(record):
+    return json.dumps(record, separators=(',', ':')).encode()
+
+def assistant(text='', usage=USAGE, model=MODEL):
+    return {'type': 'assistant',
+            'message': {'model': model, 'content': [{'type': 'text', 'text': text}], 'usage': usage}}
+
+def progress(text=''):
+    # Sub-agent progress records nest a whole assistant record, usage included
+    return {'type': 'progress', 'data': {'message': assistant(text)}}
+
+def parse_whole(blob):
+    """Reference result: every line parsed in full"""
+    return at._parse_lines(blob.split(b'\n'))
+
+def parse_chunked(blob):
+    return at._parse_lines(at._read_lines(io.BytesIO(blob)))
+
+# Lines whose shape the long-line scanner has to get right
+SCANNER_CASES = [
+    encode(assistant('hello')),
+    encode(progress('hello')),
+    encode({'message': {'model': MODEL, 'content': 'x'}, 'toolUseResult': {'usage': USAGE}}),
+    encode({'message': {'model': MODEL, 'usage': {}}, 'usage': {'input_tokens': 5}}),
+    encode({'message': {'role': 'user', 'content': 'hi'}, 'usage': USAGE}),
+    encode({'usage': USAGE, 'message': {'usage': {'output_tokens': 1}, 'model': MODEL}}),
+    encode(assistant('{"message":{"model":"fake","usage":{"input_tokens":1}}} \\" }{][')),
+    encode(assistant('\\\\')) + b'  ',
+    json.dumps(assistant('café ☃')).encode(),
+    encode(assistant('x', model='m\\"odel')),
+    encode(assistant('x'))[:-1],
+    encode(assistant('x')) + b' {}',
+    encode([assistant('x')]),
+    b'{"message":{"model":"a","model":"b","usage":{"input_tokens":1}}}',
+    b'{"message":{"model":"a","usage":{"input_tokens":1},"usage":{"input_tokens":2}}}',
+    b'{"message":null,"usage":{"input_tokens":3}}',
+    b'{"usag\\u0065":{"input_tokens":3}}',
+]
+
+class ParseLinesTest(unittest.TestCase):
+
+    def test_float_counts_are_coerced(self):
+        blob = encode(assistant(usage={'input_tokens': 1.0, 'output_tokens': 2}))
+        inp, out, cr, cc, model_ids, model_names = parse_whole(blob)
+        self.assertEqual((list(inp), list(out), list(cr)), ([1], [2], [0]))
+
+    def test_unusable_counts_skip_the_message(self):
+        lines = [encode(assistant(usage={'input_tokens': 2 ** 70})),
+                 encode(assistant(usage={'input_tokens': 5, 'output_tokens': None})),
+                 encode(assistant())]
+        with contextlib.redirect_stderr(io.StringIO()) as stderr:
+            inp, out, cr, cc, model_ids, model_names = parse_whole(b'\n'.join(lines))
+        self.assertEqual(stderr.getvalue().count('Warning'), 2)
+        self.assertEqual([list(column) for column in (inp, out, cr, cc, model_ids)],
+                         [[12], [34], [5600], [78], [0]])
+
+class ScanTest(unittest.TestCase):
+
+    def test_cache_events(self):
+        # (input, output, cache read, cache creation) per message
+        rows = [(100, 10, 0, 0), (5, 20, 0, 2000), (7, 30, 2000, 0),
+                (8, 1, 3500, 100), (9, 1, 5000, 100), (1, 1, 5500, 100),
+                (2, 1, 100, 100), (3, 1, 20000, 100), (4, 1, 5000, 100)]
+        inp, out, cr, cc = (at._column(at.array('q', column)) for column in zip(*rows))
+        n = len(rows)
+        events, magnitudes, efficiency, cumulative = at._zeros(n), at._zeros(n), at._zeros(n, 'd'), at._zeros(n)
+        totals = at._scan(inp, out, cr, cc, events, magnitudes, efficiency, cumulative)
+        self.assertEqual(tuple(totals), (139, 66, 41100, 2600, 1, 15000))
+        self.assertEqual(list(events), [at.EVENT_NONE, at.EVENT_CACHE_START, at.EVENT_CACHE_READ,
+                                        at.EVENT_CACHE_START, at.EVENT_GREW, at.EVENT_NONE,
+                                        at.EVENT_NONE, at.EVENT_GREW, at.EVENT_INVALIDATION])
+        self.assertEqual(list(magnitudes), [0, 0, 0, 0, 1500, 0, 0, 19900, 15000])
+        self.assertEqual(list(cumulative), [100, 105, 112, 120, 129, 130, 132, 135, 139])
+        self.assertEqual(efficiency[0], 0)
+        self.assertAlmostEqual(efficiency[2], 2000 / 2007 * 100)
+
+class CostTest(unittest.TestCase):
+
+    SONNET = 'claude-sonnet-4-5-20250929'
+    HAIKU = 'claude-3-5-haiku-20241022'
+
+    def test_costs_per_model(self):
+        # Sonnet 4.5: 3 + 30 + 3 + 1.5; Haiku 3.5: 0.4 + 0.4
+        token_rows = [[1_000_000, 2_000_000, 10_000_000, 400_000], [500_000, 100_000, 0, 0]]
+        price_ids = [at._PRICE_INDEX[self.SONNET], at._PRICE_INDEX[self.HAIKU]]
+        for matrix in (at._PRICE_MATRIX, None):
+            with self.subTest(vectorised=matrix is not None), \
+                    mock.patch.object(at, '_PRICE_MATRIX', matrix):
+                costs = [float(cost) for cost in at._costs(token_rows, price_ids)]
+                self.assertEqual(len(costs), 2)
+                self.assertAlmostEqual(costs[0], 37.5)
+                self.assertAlmostEqual(costs[1], 0.8)
+
+    def test_cost_without_cache(self):
+        lines = [encode(assistant(usage={'input_tokens': 1_000_000, 'cache_read_input_tokens': 2_000_000},
+                                  model=self.SONNET)),
+                 encode(assistant(usage={'input_tokens': 1_000_000, 'cache_read_input_tokens': 1_000_000},
+                                  model=self.HAIKU)),
+                 encode(assistant(model='unpriced'))]
+        fd, path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(b'\n'.join(lines) + b'\n')
+        try:
+            with contextlib.redirect_stdout(io.StringIO()) as stdout:
+                at.analyze_transcript(path)
+        finally:
+            os.unlink(path)
+        # Actual: 3 + 0.6 and 0.8 + 0.08; without cache all input is fresh: 9 and 1.6
+        report = stdout.getvalue()
+        self.assertIn('TOTAL COST:          $4.4800', report)
+        self.assertIn('Cost without cache:  $10.60', report)
+        self.assertIn('Savings from cache:  $6.12 (57.7%)', report)
+        self.assertIn('Cost:     Unknown (pricing not available)', report)
+
+class UsageScannerTest(unittest.TestCase):
+
+    def scan(self, line, cuts):
+        scanner = at._UsageScanner()
+        start = 0
+        for cut in list(cuts) + [len(line)]:
+            scanner.feed(line[start:cut])
+            start = cut
+        return scanner.record()
+
+    def assertSameUsage(self, line, record):
+        # None means the caller reads the line back and parses it whole
+        self.assertEqual(at._extract_usage(line if record is None else record),
+                         at._extract_usage(line))
+
+    def test_every_split_point(self):
+        for line in SCANNER_CASES:
+            for cut in range(len(line) + 1):
+                with self.subTest(line=line, cut=cut):
+                    self.assertSameUsage(line, self.scan(line, [cut]))
+
+    def test_single_byte_pieces(self):
+        for line in SCANNER_CASES:
+            with self.subTest(line=line):
+                self.assertSameUsage(line, self.scan(line, range(1, len(line))))
+
+    def test_nested_progress_record_has_no_usage(self):
+        self.assertEqual(self.scan(encode(progress('x')), []), b'')
+
+    def test_stand_in_keeps_model_and_usage(self):
+        record = self.scan(encode(assistant('x' * 1000)), [300, 700])
+        self.assertEqual(at._extract_usage(record), (USAGE, MODEL))
+        self.assertLess(len(record), 200)
+
+    def test_truncated_line_has_no_usage(self):
+        self.assertEqual(self.scan(encode(assistant('x'))[:-2], []), b'')
+
+    def test_duplicate_keys_are_read_back(self):
+        line = b'{"usage":{"input_tokens":1},"usage":{"input_tokens":2}}'
+        self.assertIsNone(self.scan(line, []))
+
+class ReadLinesTest(unittest.TestCase):
+
+    def test_keys_split_around_chunk_boundary(self):
+        # Put the message key, then the usage key, at every offset within
+        # 400 bytes of the first and second chunk boundary
+        shifts = sorted(set(range(-400, 401, 50)) | set(range(-12, 13)))
+        prefix = b'{"type":"assistant","pad":"'
+        middle = b'","message":{"model":"' + MODEL.encode() + b'","content":"'
+        suffix = b'","usage":' + encode(USAGE) + b'}}'
+        for shift in shifts:
+            # "message" starts 2 bytes into middle, "usage" 2 bytes into suffix
+            pad = at._CHUNK_BYTES + shift - len(prefix) - 2
+            content = at._CHUNK_BYTES - len(middle)
+            for lines in ([prefix + b'p' * pad + middle + b'c' * content + suffix],
+                          [encode(assistant('short')), prefix + b'p' * pad + middle + b'c' * content + suffix,
+                           encode(progress('x' * (2 * at._CHUNK_BYTES + shift)))]):
+                blob = b'\n'.join(lines) + b'\n'
+                with self.subTest(shift=shift, lines=len(lines)):
+                    self.assertEqual(parse_chunked(blob), parse_whole(blob))
+
+    def test_long_lines(self):
+        long_text = 'x' * (2 * at._CHUNK_BYTES + 123)
+        lines = [
+            encode(assistant(long_text)),
+            encode(progress(long_text)),
+            encode({'message': {'model': MODEL, 'content': long_text}, 'toolUseResult': {'usage': USAGE}}),
+            # Duplicate usage keys make the scanner read the line back
+            encode(assistant(long_text))[:-2] + b',"usage":{"input_tokens":1}}}',
+            encode(assistant(long_text))[:-1],
+            encode(assistant('short')),
+        ]
+        blob = b'\n'.join(lines)
+        inp, out, cr, cc, model_ids, model_names = parse_chunked(blob)
+        self.assertEqual((inp, out, cr, cc, model_ids, model_names), parse_whole(blob))
+        self.assertEqual(list(inp), [12, 1, 12])
+
+class ShardTest(unittest.TestCase):
+
+    def setUp(self):
+        lines = []
+        for i in range(300):
+            model = ('claude-opus-4-6', 'claude-sonnet-4-5-20250929', 'other')[i % 3]
+            usage = dict(USAGE, input_tokens=i)
+            lines.append(encode(assistant('y' * (i * 37 % 500), usage, model)))
+            lines.append(encode(progress('z')))
+        lines.insert(100, encode(assistant('w' * 3 * at._CHUNK_BYTES)))
+        self.blob = b'\n'.join(lines) + b'\n'
+        fd, self.path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.blob)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_shard_bounds_cut_after_newlines(self):
+        with open(self.path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            bounds = at._shard_bounds(mm, 7)
+        self.assertEqual(bounds[0][0], 0)
+        self.assertEqual(bounds[-1][1], len(self.blob))
+        for (_, end), (start, _) in zip(bounds, bounds[1:]):
+            self.assertEqual(end, start)
+            self.assertEqual(self.blob[start - 1:start], b'\n')
+
+    def test_parallel_parse_matches_sequential(self):
+        sequential = at._parse_transcript(self.path)
+        self.assertEqual(sequential, parse_whole(self.blob))
+        for jobs in (2, 3, 8):
+            with self.subTest(jobs=jobs):
+                self.assertEqual(at._parse_transcript(self.path, jobs), sequential)
+
+    def test_parallel_parse_of_empty_file(self):
+        open(self.path, 'wb').close()
+        self.assertEqual(at._parse_transcript(self.path, 2), at._parse_transcript(self.path))
+
+def rows(columns):
+    inp, out, cr, cc, model_ids, model_names = columns
+    return list(zip(inp, out, cr, cc, (model_names[model_id] for model_id in model_ids)))
+
+class TailTest(unittest.TestCase):
+
+    def setUp(self):
+        models = ('claude-opus-4-6', 'claude-sonnet-4-5-20250929', 'other')
+        def message(i):
+            return encode(assistant('y' * (i * 37 % 900), dict(USAGE, input_tokens=i), models[i % 3]))
+        before = [message(i) for i in range(1000)]
+        # Not JSON as a whole, but any cut inside the spaces leaves a valid
+        # message, so the window's partial first line has to be dropped
+        partial = b'x' + b' ' * 1000 + encode(assistant('partial', dict(USAGE, input_tokens=-1)))
+        after = []
+        size = 0
+        while size < at._TAIL_WINDOW_BYTES - 2000:
+            after.append(message(1000 + len(after)))
+            size += len(after[-1]) + 1
+        self.window_messages = len(after)
+        self.total_messages = len(before) + len(after)
+        # Pad with a line without usage so the window starts 500 bytes into the spaces
+        filler = at._TAIL_WINDOW_BYTES - (len(partial) - 501) - 1 - size - 1
+        after.append(b'{"type":"user","pad":"' + b'p' * (filler - 24) + b'"}')
+        self.blob = b'\n'.join(before + [partial] + after) + b'\n'
+        start = len(self.blob) - at._TAIL_WINDOW_BYTES
+        self.assertEqual(self.blob[start - 1:start + 1], b'  ')
+        fd, self.path = tempfile.mkstemp(suffix='.jsonl')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.blob)
+
+    def tearDown(self):
+        os.unlink(self.path)
+
+    def test_tail_matches_last_rows(self):
+        everything = rows(at._parse_transcript(self.path))
+        self.assertEqual(len(everything), self.total_messages)
+        for count in (1, 10, self.window_messages, self.window_messages + 1, self.total_messages + 5):
+            with self.subTest(count=count), \
+                    mock.patch.object(at, '_advise_sequential', wraps=at._advise_sequential) as rescan:
+                self.assertEqual(rows(at._parse_tail(self.path, count)), everything[-count:])
+                self.assertEqual(rescan.called, count > self.window_messages)
+
+    def test_partial_first_line_is_skipped(self):
+        tail = rows(at._parse_tail(self.path, self.window_messages))
+        self.assertNotIn(-1, [row[0] for row in tail])
+
+if __name__ == '__main__':
+    unittest.main()